@@ -5,20 +5,31 @@ import os
 import json
 from typing import Dict, Any
 from fastapi import FastAPI, Query, Body
+from fastapi.responses import ORJSONResponse
 import uvicorn
 import logging
 from contextlib import asynccontextmanager
 
-from modules.log_config import setup_logging
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from modules.log_config import setup_logging, shutdown_logging
 from modules.config_manager import ensure_config_exists, load_config
-from modules.websocket_manager import connect_to_onebot, get_websocket_connections
+from modules.websocket_manager import connect_to_onebot, get_current_connection, is_connection_open
 from modules.ai_handler import init_ai
-from modules.file_api_handler import init_file_api, api_get_file, api_put_file
+from modules.file_api_handler import init_file_api, api_get_file, api_put_file, shutdown as shutdown_file_api
 from modules.minecraft_log_parser import parse_minecraft_logs
 from modules.websocket_manager import send_message
-from modules.memory_manager import refresh_user_memory, SHORT_TERM_DIR
-import glob
-import os
+from modules.memory_manager import refresh_user_memory, active_user_ids, flush_user_memories
+from modules.persistent_events_storage import flush_events
 
 # 配置日志
 setup_logging()
@@ -52,36 +63,88 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         logger.info("关闭应用程序")
-        websocket_connections = get_websocket_connections()
-        for connection in websocket_connections.values():
-            if hasattr(connection, 'open') and connection.open:
-                await connection.close()
-        # 取消后台任务
+        connection = get_current_connection()
+        if is_connection_open(connection):
+            await connection.close()
+        # 取消后台任务并并行等待它们退出
         task.cancel()
         log_task.cancel()
         memory_task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
-        try:
-            await log_task
-        except asyncio.CancelledError:
-            pass
-        try:
-            await memory_task
-        except asyncio.CancelledError:
-            pass
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
-        try:
-            await log_task
-        except asyncio.CancelledError:
-            pass
+        await asyncio.gather(task, log_task, memory_task, return_exceptions=True)
+        # 落盘待写入的记忆和事件记录
+        flush_user_memories()
+        flush_events()
+        # 关闭HTTP连接池
+        await shutdown_file_api()
+        # 停止日志监听器，冲刷剩余日志
+        shutdown_logging()
+
+# orjson可用时所有接口响应都用ORJSONResponse编码，避免stdlib json的编码开销
+if orjson is not None:
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+else:
+    app = FastAPI(lifespan=lifespan)
+
+# 预序列化的OneBot请求字节模板：orjson可用时直接填充模板，
+# 省去每次请求构造嵌套dict/list再整体序列化的开销（发送路径接受bytes直通）
+_PRIVATE_TEXT_TEMPLATE = b'{"action":"send_private_msg","params":{"user_id":%b,"message":[{"type":"text","data":{"text":%b}}]}}'
+_GROUP_TEXT_TEMPLATE = b'{"action":"send_group_msg","params":{"group_id":%b,"message":[{"type":"text","data":{"text":%b}}]}}'
+_PRIVATE_SEND_MSG_TEMPLATE = b'{"action":"send_msg","params":{"message_type":"private","user_id":%b,"message":%b}}'
+_GROUP_SEND_MSG_TEMPLATE = b'{"action":"send_msg","params":{"message_type":"group","group_id":%b,"message":%b}}'
+
+
+def _private_text_payload(user_id: str, text: str):
+    """构造send_private_msg文本消息负载"""
+    if orjson is not None:
+        return _PRIVATE_TEXT_TEMPLATE % (orjson.dumps(user_id), orjson.dumps(text))
+    return {
+        "action": "send_private_msg",
+        "params": {
+            "user_id": user_id,
+            "message": [{"type": "text", "data": {"text": text}}]
+        }
+    }
+
 
-app = FastAPI(lifespan=lifespan)
+def _group_text_payload(group_id: str, text: str):
+    """构造send_group_msg文本消息负载"""
+    if orjson is not None:
+        return _GROUP_TEXT_TEMPLATE % (orjson.dumps(group_id), orjson.dumps(text))
+    return {
+        "action": "send_group_msg",
+        "params": {
+            "group_id": group_id,
+            "message": [{"type": "text", "data": {"text": text}}]
+        }
+    }
+
+
+def _private_send_msg_payload(user_id, message):
+    """构造send_msg私聊消息负载"""
+    if orjson is not None:
+        return _PRIVATE_SEND_MSG_TEMPLATE % (orjson.dumps(user_id), orjson.dumps(message))
+    return {
+        "action": "send_msg",
+        "params": {
+            "message_type": "private",
+            "user_id": user_id,
+            "message": message
+        }
+    }
+
+
+def _group_send_msg_payload(group_id, message):
+    """构造send_msg群聊消息负载"""
+    if orjson is not None:
+        return _GROUP_SEND_MSG_TEMPLATE % (orjson.dumps(group_id), orjson.dumps(message))
+    return {
+        "action": "send_msg",
+        "params": {
+            "message_type": "group",
+            "group_id": group_id,
+            "message": message
+        }
+    }
 
 
 @app.post("/api/send_message")
@@ -111,21 +174,7 @@ async def api_send_private_msg(user_id: str, message: str):
     Returns:
         发送结果
     """
-    message_data = {
-        "action": "send_private_msg",
-        "params": {
-            "user_id": user_id,
-            "message": [
-                {
-                    "type": "text",
-                    "data": {
-                        "text": message
-                    }
-                }
-            ]
-        }
-    }
-    await send_message(message_data)
+    await send_message(_private_text_payload(user_id, message))
     return {"status": "success", "message": "私聊消息已发送"}
 
 
@@ -141,21 +190,7 @@ async def api_send_group_msg(group_id: str, message: str):
     Returns:
         发送结果
     """
-    message_data = {
-        "action": "send_group_msg",
-        "params": {
-            "group_id": group_id,
-            "message": [
-                {
-                    "type": "text",
-                    "data": {
-                        "text": message
-                    }
-                }
-            ]
-        }
-    }
-    await send_message(message_data)
+    await send_message(_group_text_payload(group_id, message))
     return {"status": "success", "message": "群聊消息已发送"}
 
 
@@ -174,15 +209,7 @@ async def api_send_private_message(data: Dict[str, Any]):
     Returns:
         发送结果
     """
-    message = {
-        "action": "send_msg",
-        "params": {
-            "message_type": "private",
-            "user_id": data.get("user_id"),
-            "message": data.get("message", "")
-        }
-    }
-    await send_message(message)
+    await send_message(_private_send_msg_payload(data.get("user_id"), data.get("message", "")))
     return {"status": "success", "message": "私聊消息已发送"}
 
 
@@ -201,15 +228,7 @@ async def api_send_group_message(data: Dict[str, Any]):
     Returns:
         发送结果
     """
-    message = {
-        "action": "send_msg",
-        "params": {
-            "message_type": "group",
-            "group_id": data.get("group_id"),
-            "message": data.get("message", "")
-        }
-    }
-    await send_message(message)
+    await send_message(_group_send_msg_payload(data.get("group_id"), data.get("message", "")))
     return {"status": "success", "message": "群聊消息已发送"}
 
 
@@ -221,9 +240,7 @@ async def api_status():
     Returns:
         连接状态
     """
-    websocket_connections = get_websocket_connections()
-    connection = websocket_connections.get("onebot")
-    status = "connected" if connection and hasattr(connection, 'open') and connection.open else "disconnected"
+    status = "connected" if is_connection_open(get_current_connection()) else "disconnected"
     logger.info(f"检查连接状态: {status}")
     return {"status": status}
 
@@ -297,25 +314,33 @@ async def memory_refresh_task():
         try:
             # 每小时执行一次记忆刷新
             await asyncio.sleep(3600)  # 1小时
-            
-            # 获取所有用户ID（通过短期记忆文件名）
-            user_ids = set()
-            if os.path.exists(SHORT_TERM_DIR):
-                for filename in os.listdir(SHORT_TERM_DIR):
-                    if filename.endswith('.json'):
-                        user_id = filename.split('_')[0]
-                        user_ids.add(user_id)
-            
-            # 为每个用户刷新记忆
-            for user_id in user_ids:
-                try:
-                    refresh_user_memory(user_id)
-                except Exception as e:
-                    logger.error(f"刷新用户 {user_id} 的记忆时出错: {e}")
-                    
+
+            # 直接使用内存中的用户索引，不再重新扫描记忆目录
+            user_ids = list(active_user_ids)
+            if not user_ids:
+                continue
+
+            # 在线程池中并发刷新，避免同步文件IO阻塞事件循环
+            sem = asyncio.Semaphore(8)
+
+            async def _refresh_one(user_id: str):
+                async with sem:
+                    try:
+                        await asyncio.to_thread(refresh_user_memory, user_id)
+                    except Exception as e:
+                        logger.error(f"刷新用户 {user_id} 的记忆时出错: {e}")
+
+            await asyncio.gather(*(_refresh_one(u) for u in user_ids), return_exceptions=True)
+
         except Exception as e:
             logger.error(f"记忆刷新任务出错: {e}")
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=config['server']['host'], port=config['server']['port'])
\ No newline at end of file
+    # uvloop的上下文切换和socket I/O比默认事件循环快2-3倍
+    uvicorn.run(
+        app,
+        host=config['server']['host'],
+        port=config['server']['port'],
+        loop="uvloop" if UVLOOP_AVAILABLE else "asyncio"
+    )
\ No newline at end of file
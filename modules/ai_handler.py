@@ -1,11 +1,23 @@
+import hashlib
+import json
 import logging
+import re
+from collections import OrderedDict
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     AI_AVAILABLE = True
 except ImportError:
     AI_AVAILABLE = False
     logging.warning("openai库未安装，AI功能不可用")
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 工具调用参数解析函数，优先使用orjson
+_loads = orjson.loads if orjson is not None else json.loads
+
 # 导入记忆管理模块
 from modules.memory_manager import add_user_memory, format_memories_for_ai
 
@@ -19,6 +31,16 @@ AI_ENABLED = False
 # 存储用户消息上下文
 user_contexts = {}
 
+# @机器人探测标记缓存，按self_id预生成，避免每条消息重建f-string
+_at_token_cache = {}
+
+# AI回复精确匹配缓存（LRU），相同问题直接返回缓存回复，省去LLM往返
+_exact_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_EXACT_CACHE_MAX = 1024
+
+# 传送指令触发模式：一次扫描替代多个独立的子串查找
+_TP_RE = re.compile(r'传送.*[把将]|[把将].*传送')
+
 
 def init_ai(config):
     """
@@ -32,9 +54,9 @@ def init_ai(config):
     AI_CONFIG = config
     AI_ENABLED = bool(AI_CONFIG.get('api_key')) and AI_AVAILABLE
 
-    # 初始化AI客户端
+    # 初始化AI客户端（异步客户端，避免LLM请求阻塞事件循环）
     if AI_ENABLED:
-        ai_client = OpenAI(
+        ai_client = AsyncOpenAI(
             api_key=AI_CONFIG['api_key'],
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
         )
@@ -63,7 +85,10 @@ def should_ai_reply(message_type: str, message: str, self_id: str = None) -> boo
     
     # 群聊中只有在@机器人时才回复
     if message_type == "group" and self_id:
-        return f"[CQ:at,qq={self_id}]" in message
+        token = _at_token_cache.get(self_id)
+        if token is None:
+            token = _at_token_cache.setdefault(self_id, f"[CQ:at,qq={self_id}]")
+        return token in message
     
     return False
 
@@ -117,16 +142,21 @@ async def get_ai_response(message: str, config=None, execute_command_func=None,
     try:
         system_prompt = AI_CONFIG.get("system_prompt", "")
         model = AI_CONFIG.get("model", "")
-        
-        # 检查是否是传送命令
-        tools = []
-        tool_choice = "auto"
-        
-        # 如果消息包含传送关键词，则提供传送工具
-        if "传送" in message and ("把" in message or "将" in message):
-            tools = [get_teleport_tool()]
-            tool_choice = {"type": "function", "function": {"name": "teleport_player"}}
-        
+
+        # 检查是否是传送命令（工具调用必须真正执行，不走缓存）
+        wants_teleport = _TP_RE.search(message) is not None
+
+        cache_key = None
+        if not wants_teleport:
+            prompt_hash = hashlib.blake2b(system_prompt.encode("utf-8"), digest_size=8).digest()
+            cache_key = (user_id, prompt_hash, message)
+            cached = _exact_cache.get(cache_key)
+            if cached is not None:
+                _exact_cache.move_to_end(cache_key)
+                if user_id:
+                    add_user_memory(user_id, message, cached)
+                return cached
+
         # 准备参数
         messages = [
             {"role": "system", "content": system_prompt}
@@ -145,62 +175,76 @@ async def get_ai_response(message: str, config=None, execute_command_func=None,
             "model": model,
             "messages": messages,
             "extra_body": {"enable_search": True},
-            "stream": False
+            "stream": True
         }
         
-        # 检查是否是传送命令
-        tools = []
-        
         # 如果消息包含传送关键词，则提供传送工具
-        if "传送" in message and ("把" in message or "将" in message):
-            tools = [get_teleport_tool()]
+        if wants_teleport:
+            params["tools"] = [get_teleport_tool()]
             params["tool_choice"] = {"type": "function", "function": {"name": "teleport_player"}}
-        
-        # 只有在有工具时才添加tools参数
-        if tools:
-            params["tools"] = tools
-        
-        completion = ai_client.chat.completions.create(**params)
-        
-        # 获取AI回复
-        ai_response = completion.choices[0].message.content
-        
+
+        stream = await ai_client.chat.completions.create(**params)
+
+        # 流式接收：增量累积回复内容与工具调用参数，
+        # 避免等待整份完成体并在内存中整体持有
+        content_parts = []
+        tool_name = None
+        tool_args_parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta is None:
+                continue
+            if delta.content:
+                content_parts.append(delta.content)
+            if delta.tool_calls:
+                for tool_call in delta.tool_calls:
+                    if tool_call.function is None:
+                        continue
+                    if tool_call.function.name:
+                        tool_name = tool_call.function.name
+                    if tool_call.function.arguments:
+                        tool_args_parts.append(tool_call.function.arguments)
+
+        ai_response = "".join(content_parts)
+
         # 保存到记忆中
         if user_id and ai_response:
             add_user_memory(user_id, message, ai_response)
-        
-        # 检查是否有工具调用
-        choice = completion.choices[0]
-        if choice.message.tool_calls:
-            # 处理工具调用
-            for tool_call in choice.message.tool_calls:
-                if tool_call.function.name == "teleport_player":
-                    # 解析参数
-                    import json
-                    try:
-                        args = json.loads(tool_call.function.arguments)
-                        player_from = args.get("player_from")
-                        player_to = args.get("player_to")
-
-                        if not player_from or not player_to:
-                            return "传送指令参数不完整，请指定正确的玩家和目标。"
-
-                        # 执行传送命令
-                        if execute_command_func and config:
-                            file_api_config = config.get('file_api', {})
-                            daemon_id = file_api_config.get('default_daemon_id', '')
-                            uuid = file_api_config.get('default_uuid', '')
-
-                            command = f"tp {player_from} {player_to}"
-                            result = await execute_command_func(daemon_id, uuid, command)
-
-                            if result.get("status") == "success":
-                                return f"已将玩家 {player_from} 传送到 {player_to}"
-                            else:
-                                return f"传送失败: {result.get('message', '未知错误')}"
-                    except json.JSONDecodeError:
-                        return "无法解析传送指令参数。"
-        
+
+        # 写入回复缓存（LRU淘汰）
+        if cache_key is not None and ai_response:
+            _exact_cache[cache_key] = ai_response
+            if len(_exact_cache) > _EXACT_CACHE_MAX:
+                _exact_cache.popitem(last=False)
+
+        # 检查是否有工具调用（参数在流式接收时增量拼接，结束后一次性解析）
+        if tool_name == "teleport_player":
+            try:
+                args = _loads("".join(tool_args_parts))
+                player_from = args.get("player_from")
+                player_to = args.get("player_to")
+
+                if not player_from or not player_to:
+                    return "传送指令参数不完整，请指定正确的玩家和目标。"
+
+                # 执行传送命令
+                if execute_command_func and config:
+                    file_api_config = config.get('file_api', {})
+                    daemon_id = file_api_config.get('default_daemon_id', '')
+                    uuid = file_api_config.get('default_uuid', '')
+
+                    command = f"tp {player_from} {player_to}"
+                    result = await execute_command_func(daemon_id, uuid, command)
+
+                    if result.get("status") == "success":
+                        return f"已将玩家 {player_from} 传送到 {player_to}"
+                    else:
+                        return f"传送失败: {result.get('message', '未知错误')}"
+            except json.JSONDecodeError:
+                return "无法解析传送指令参数。"
+
         return ai_response
     except Exception as e:
         logger.error(f"获取AI回复时发生错误: {e}")
@@ -2,6 +2,11 @@ import os
 import json
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -35,12 +40,20 @@ def ensure_config_exists(config_path: str):
                 "api_key": "your-api-key-here",
                 "default_daemon_id": "default-daemon-id",
                 "default_uuid": "default-instance-uuid"
+            },
+            "minecraft_log": {
+                "source": "http",
+                "local_path": ""
             }
         }
         
         # 写入示例配置
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(sample_config, f, ensure_ascii=False, indent=4)
+        if orjson is not None:
+            with open(config_path, 'wb') as f:
+                f.write(orjson.dumps(sample_config, option=orjson.OPT_INDENT_2))
+        else:
+            with open(config_path, 'w', encoding='utf-8') as f:
+                json.dump(sample_config, f, ensure_ascii=False, indent=4)
         
         logger.info(f"已创建示例配置文件: {config_path}")
         logger.info("请修改配置文件中的参数以匹配您的实际环境")
@@ -56,5 +69,8 @@ def load_config(config_path: str):
     Returns:
         dict: 配置信息
     """
+    if orjson is not None:
+        with open(config_path, 'rb') as f:
+            return orjson.loads(f.read())
     with open(config_path, 'r', encoding='utf-8') as f:
         return json.load(f)
\ No newline at end of file
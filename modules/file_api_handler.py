@@ -1,11 +1,43 @@
+import asyncio
 import logging
+import time
 import httpx
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, List
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
-# HTTP客户端用于外部API调用
-http_client = httpx.AsyncClient()
+# HTTP客户端用于外部API调用：惰性创建，首次在事件循环内使用时构建，
+# 避免导入期创建导致跨事件循环复用的"Event loop is closed"问题
+http_client = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """
+    获取HTTP客户端实例（首次调用时创建并绑定当前事件循环）
+
+    显式连接池上限、HTTP/2复用与有界超时，
+    避免突发请求时的握手开销和无限等待。
+    """
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60),
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(10.0, connect=5.0)
+        )
+    return http_client
 
 # 文件API配置
 FILE_API_CONFIG = {}
@@ -13,6 +45,76 @@ FILE_API_BASE_URL = ""
 FILE_API_KEY = ""
 FILE_DEFAULT_DAEMON_ID = ""
 FILE_DEFAULT_UUID = ""
+# 在init_file_api时一次性计算的静态请求要素：
+# 命令接口URL（避免每次调用做字符串replace）和公共查询参数
+CMD_URL = ""
+_BASE_PARAMS = MappingProxyType({})
+
+# GET文件响应缓存：(daemonId, uuid, target) -> (取得时间, 响应, ETag, Last-Modified)
+# TTL内直接命中；过期后带条件请求头重新校验，304视为命中
+_FILE_CACHE_TTL = 5.0
+_file_cache: Dict[tuple, tuple] = {}
+
+
+def _parse_body(response: httpx.Response):
+    """解析响应体为Python对象，响应为空时返回None"""
+    if not response.content:
+        return None
+    return orjson.loads(response.content) if orjson is not None else response.json()
+
+
+async def _request(method: str, url: str, *, params=None, json=None, headers=None,
+                   retries: int = 3, log_name: str = "文件API"):
+    """
+    发送HTTP请求并统一处理错误
+
+    瞬时故障（网络错误、5xx）按指数退避重试；其余错误立即返回
+    规范化的错误字典。成功（含304）时返回原始响应对象，由调用方
+    决定如何构造结果。
+
+    Args:
+        method: HTTP方法
+        url: 请求URL
+        params: 查询参数
+        json: 请求体
+        headers: 请求头
+        retries: 最大尝试次数
+        log_name: 日志中使用的接口名称
+
+    Returns:
+        成功时为httpx.Response，失败时为错误字典
+    """
+    client = await get_http_client()
+    for attempt in range(retries):
+        try:
+            response = await client.request(method, url, params=params, json=json, headers=headers)
+            if response.status_code == 304:
+                return response
+            response.raise_for_status()
+
+            # 记录成功状态
+            logger.info(f"{log_name}请求成功")
+            return response
+        except httpx.HTTPError as e:
+            transient = isinstance(e, httpx.TransportError) or (
+                isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500
+            )
+            if transient and attempt < retries - 1:
+                await asyncio.sleep(0.2 * 2 ** attempt)
+                continue
+            logger.error(f"{log_name}请求失败: {e}")
+            return {
+                "status": "error",
+                "message": f"请求失败: {str(e)}",
+                "detail": str(e)
+            }
+        except Exception as e:
+            logger.error(f"处理{log_name}请求时发生错误: {e}")
+            return {
+                "status": "error",
+                "message": f"处理请求时发生错误: {str(e)}",
+                "detail": str(e)
+            }
 
 
 def init_file_api(config):
@@ -24,12 +126,15 @@ def init_file_api(config):
     """
     global FILE_API_CONFIG, FILE_API_BASE_URL, FILE_API_KEY
     global FILE_DEFAULT_DAEMON_ID, FILE_DEFAULT_UUID
-    
+    global CMD_URL, _BASE_PARAMS
+
     FILE_API_CONFIG = config
     FILE_API_BASE_URL = FILE_API_CONFIG.get('base_url', '')
     FILE_API_KEY = FILE_API_CONFIG.get('api_key', '')
     FILE_DEFAULT_DAEMON_ID = FILE_API_CONFIG.get('default_daemon_id', '')
     FILE_DEFAULT_UUID = FILE_API_CONFIG.get('default_uuid', '')
+    CMD_URL = FILE_API_BASE_URL.replace('/api/files', '/api/protected_instance/command')
+    _BASE_PARAMS = MappingProxyType({"apikey": FILE_API_KEY})
 
 
 async def api_get_file(
@@ -54,40 +159,46 @@ async def api_get_file(
     
     # 构建请求URL
     url = FILE_API_BASE_URL
-    params = {
-        "apikey": FILE_API_KEY,
-        "daemonId": daemonId,
-        "uuid": uuid,
-        "target": target
+    params = {**_BASE_PARAMS, "daemonId": daemonId, "uuid": uuid, "target": target}
+
+    # 缓存命中时直接返回，避免重复下载相同内容
+    cache_key = (daemonId, uuid, target)
+    cached = _file_cache.get(cache_key)
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < _FILE_CACHE_TTL:
+        return cached[1]
+
+    # 缓存过期但有验证器时发送条件请求
+    headers = {}
+    if cached is not None:
+        if cached[2]:
+            headers["If-None-Match"] = cached[2]
+        if cached[3]:
+            headers["If-Modified-Since"] = cached[3]
+
+    # 发送GET请求到远程API
+    response = await _request("GET", url, params=params, headers=headers or None)
+    if isinstance(response, dict):
+        # 请求失败，直接返回错误结果
+        return response
+
+    if response.status_code == 304 and cached is not None:
+        # 内容未变化，刷新缓存时间戳后返回缓存结果
+        _file_cache[cache_key] = (now, cached[1], cached[2], cached[3])
+        return cached[1]
+
+    # 返回远程API的响应并写入缓存
+    result = {
+        "status": "success",
+        "data": _parse_body(response)
     }
-    
-    try:
-        # 发送GET请求到远程API
-        response = await http_client.get(url, params=params)
-        response.raise_for_status()
-        
-        # 记录成功状态
-        logger.info("文件API请求成功")
-        
-        # 返回远程API的响应
-        return {
-            "status": "success",
-            "data": response.json() if response.content else None
-        }
-    except httpx.HTTPError as e:
-        logger.error(f"文件API请求失败: {e}")
-        return {
-            "status": "error",
-            "message": f"请求失败: {str(e)}",
-            "detail": str(e)
-        }
-    except Exception as e:
-        logger.error(f"处理文件API请求时发生错误: {e}")
-        return {
-            "status": "error",
-            "message": f"处理请求时发生错误: {str(e)}",
-            "detail": str(e)
-        }
+    _file_cache[cache_key] = (
+        now,
+        result,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified")
+    )
+    return result
 
 
 async def api_put_file(
@@ -112,51 +223,84 @@ async def api_put_file(
     
     # 构建请求URL
     url = FILE_API_BASE_URL
-    params = {
-        "apikey": FILE_API_KEY,
-        "daemonId": daemonId,
-        "uuid": uuid
-    }
-    
+    params = {**_BASE_PARAMS, "daemonId": daemonId, "uuid": uuid}
+
     # 构建请求体
     body = {
         "target": target
     }
     
-    try:
-        # 发送PUT请求到远程API
-        response = await http_client.put(url, params=params, json=body)
-        response.raise_for_status()
-        
-        # 记录成功状态
-        logger.info("文件API请求成功")
-        
-        # 返回远程API的响应
-        return {
-            "status": "success",
-            "data": response.json() if response.content else None
-        }
-    except httpx.HTTPError as e:
-        logger.error(f"文件API请求失败: {e}")
-        return {
-            "status": "error",
-            "message": f"请求失败: {str(e)}",
-            "detail": str(e)
-        }
-    except Exception as e:
-        logger.error(f"处理文件API请求时发生错误: {e}")
-        return {
-            "status": "error",
-            "message": f"处理请求时发生错误: {str(e)}",
-            "detail": str(e)
-        }
-
-
-async def get_http_client():
-    """
-    获取HTTP客户端实例
+    # 发送PUT请求到远程API
+    response = await _request("PUT", url, params=params, json=body)
+    if isinstance(response, dict):
+        return response
+
+    # 返回远程API的响应
+    return {
+        "status": "success",
+        "data": _parse_body(response)
+    }
+
+
+# 批量调用的并发上限，防止瞬时打满连接池
+_batch_sem = asyncio.BoundedSemaphore(20)
+
+
+async def api_get_files(
+    daemonId: str,
+    uuid: str,
+    targets: List[str]
+):
     """
-    return http_client
+    并发获取多个远程文件内容
+
+    Args:
+        daemonId: Daemon ID
+        uuid: Instance UUID
+        targets: 目标文件路径列表
+
+    Returns:
+        与targets顺序对应的响应结果列表
+    """
+    async def _one(target: str):
+        async with _batch_sem:
+            return await api_get_file(daemonId, uuid, target)
+
+    return await asyncio.gather(*(_one(t) for t in targets))
+
+
+async def execute_commands(
+    daemonId: str,
+    uuid: str,
+    commands: List[str]
+):
+    """
+    并发执行多条远程实例命令
+
+    Args:
+        daemonId: Daemon ID
+        uuid: Instance UUID
+        commands: 要执行的命令列表
+
+    Returns:
+        与commands顺序对应的响应结果列表
+    """
+    async def _one(command: str):
+        async with _batch_sem:
+            return await execute_command(daemonId, uuid, command)
+
+    return await asyncio.gather(*(_one(c) for c in commands))
+
+
+async def shutdown():
+    """
+    关闭HTTP客户端，释放连接池
+    """
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+        logger.info("HTTP客户端已关闭")
 
 
 async def execute_command(
@@ -179,38 +323,16 @@ async def execute_command(
         logger.error("命令执行API请求失败: 配置缺失")
         return {"status": "error", "message": "文件API配置缺失"}
     
-    url = FILE_API_BASE_URL.replace('/api/files', '/api/protected_instance/command')
-    params = {
-        "apikey": FILE_API_KEY,
-        "daemonId": daemonId,
-        "uuid": uuid,
-        "command": command
-    }
+    url = CMD_URL
+    params = {**_BASE_PARAMS, "daemonId": daemonId, "uuid": uuid, "command": command}
     
-    try:
-        # 发送GET请求到远程API
-        response = await http_client.get(url, params=params)
-        response.raise_for_status()
-        
-        # 记录成功状态
-        logger.info("命令执行API请求成功")
-        
-        # 返回远程API的响应
-        return {
-            "status": "success",
-            "data": response.json() if response.content else None
-        }
-    except httpx.HTTPError as e:
-        logger.error(f"命令执行API请求失败: {e}")
-        return {
-            "status": "error",
-            "message": f"请求失败: {str(e)}",
-            "detail": str(e)
-        }
-    except Exception as e:
-        logger.error(f"处理命令执行API请求时发生错误: {e}")
-        return {
-            "status": "error",
-            "message": f"处理请求时发生错误: {str(e)}",
-            "detail": str(e)
-        }
\ No newline at end of file
+    # 发送GET请求到远程API
+    response = await _request("GET", url, params=params, log_name="命令执行API")
+    if isinstance(response, dict):
+        return response
+
+    # 返回远程API的响应
+    return {
+        "status": "success",
+        "data": _parse_body(response)
+    }
\ No newline at end of file
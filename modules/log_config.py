@@ -1,30 +1,56 @@
 import os
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+# 后台日志监听器，由shutdown_logging停止
+_listener = None
 
 
 def setup_logging():
     """
     配置日志系统
+
+    日志调用只做入队操作，实际的文件/控制台写入由后台线程的
+    QueueListener完成，避免磁盘IO阻塞事件循环。
     """
+    global _listener
+
     # 获取根日志记录器
     logger = logging.getLogger()
-    
+
     # 检查是否已经配置过处理器，避免重复添加
     if logger.handlers:
         # 如果已经有处理器，先清除它们
         logger.handlers.clear()
-    
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
     # 配置日志
     log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     log_file = os.path.join(os.path.dirname(__file__), '..', 'bot.log')
-    log_handler = RotatingFileHandler(log_file, maxBytes=100*1024*1024, backupCount=5)  # 最大1MB，保留5个备份
+    log_handler = RotatingFileHandler(log_file, maxBytes=100*1024*1024, backupCount=5)  # 最大100MB，保留5个备份
     log_handler.setFormatter(log_formatter)
 
     # 添加控制台处理器
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(log_formatter)
 
+    # 日志记录经队列转发到后台线程写入
+    log_queue = queue.SimpleQueue()
     logger.setLevel(logging.INFO)
-    logger.addHandler(log_handler)
-    logger.addHandler(console_handler)
\ No newline at end of file
+    logger.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, log_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """
+    停止日志监听器并冲刷剩余的日志记录
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -4,10 +4,63 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 import asyncio
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+
+def _read_json(file_path: str):
+    """读取JSON文件（优先使用orjson解析原始字节）"""
+    if orjson is not None:
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(file_path: str, data):
+    """写入JSON文件（优先使用orjson序列化）"""
+    if orjson is not None:
+        with open(file_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _read_jsonl(file_path: str) -> List[Dict[str, Any]]:
+    """逐行读取JSONL文件"""
+    loads = orjson.loads if orjson is not None else json.loads
+    entries = []
+    with open(file_path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(loads(line))
+            except ValueError:
+                logger.warning(f"跳过无法解析的记忆行: {file_path}")
+    return entries
+
+
+def _append_jsonl(file_path: str, entries: List[Dict[str, Any]]):
+    """以追加方式写入JSONL条目（O(新增条目)而非整文件重写）"""
+    if orjson is not None:
+        data = b"".join(orjson.dumps(entry) + b"\n" for entry in entries)
+    else:
+        data = "".join(
+            json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries
+        ).encode("utf-8")
+    with open(file_path, 'ab') as f:
+        f.write(data)
+
 # 记忆存储目录
 MEMORY_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "memory")
 SHORT_TERM_DIR = os.path.join(MEMORY_DIR, "short_term")
@@ -17,8 +70,29 @@ LONG_TERM_DIR = os.path.join(MEMORY_DIR, "long_term")
 os.makedirs(SHORT_TERM_DIR, exist_ok=True)
 os.makedirs(LONG_TERM_DIR, exist_ok=True)
 
-# 内存中的记忆缓存
-memory_cache: Dict[str, Dict[str, Any]] = {}
+# 内存中的短期记忆缓存：文件路径 -> 当天的记忆条目列表
+# 写入先进缓存，由去抖的刷盘任务批量落盘，避免每条消息整读整写文件
+memory_cache: Dict[str, List[Dict[str, Any]]] = {}
+
+# 刷盘去抖窗口（秒）
+_FLUSH_DELAY = 2.0
+
+# 有记忆记录的用户ID索引：启动时从磁盘播种一次，之后随写入更新，
+# 避免记忆刷新任务反复扫描目录
+active_user_ids: set = set()
+try:
+    for _filename in os.listdir(SHORT_TERM_DIR):
+        if _filename.endswith(('.json', '.jsonl')):
+            active_user_ids.add(_filename.split('_')[0])
+except OSError as e:
+    logger.warning(f"扫描短期记忆目录时出错: {e}")
+
+# 用户记忆版本号：每次写入或刷新时递增，用于使格式化缓存失效
+user_memory_version: Dict[str, int] = {}
+
+# 长期记忆内存缓存：用户ID -> 长期记忆数据，
+# 磁盘每用户只读一次，总结写入时同步更新
+_long_term_cache: Dict[str, Dict[str, Any]] = {}
 
 
 class MemoryManager:
@@ -26,6 +100,12 @@ class MemoryManager:
     
     def __init__(self):
         self.last_refresh_date = datetime.now().date()
+        # 当天日期字符串缓存，避免每次构造文件路径都调用strftime
+        self._today_str = self.last_refresh_date.isoformat()
+        self._dirty_files: set = set()
+        self._flush_task = None
+        # 每个短期记忆文件已落盘的条目数，刷盘时只追加其后的新条目
+        self._flushed_counts: Dict[str, int] = {}
         self._check_and_refresh_short_term_memory()
     
     def _check_and_refresh_short_term_memory(self):
@@ -34,6 +114,7 @@ class MemoryManager:
         if self.last_refresh_date != current_date:
             self._refresh_short_term_memory()
             self.last_refresh_date = current_date
+            self._today_str = current_date.isoformat()
     
     def _refresh_short_term_memory(self):
         """刷新短期记忆"""
@@ -47,13 +128,71 @@ class MemoryManager:
             logger.error(f"刷新短期记忆时出错: {e}")
     
     def _get_user_short_term_file(self, user_id: str) -> str:
-        """获取用户的短期记忆文件路径"""
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        return os.path.join(SHORT_TERM_DIR, f"{user_id}_{current_date}.json")
+        """获取用户的短期记忆文件路径（追加式JSONL格式）"""
+        return os.path.join(SHORT_TERM_DIR, f"{user_id}_{self._today_str}.jsonl")
     
     def _get_long_term_file(self, user_id: str) -> str:
         """获取用户的长期记忆文件路径"""
         return os.path.join(LONG_TERM_DIR, f"{user_id}_long_term.json")
+
+    def _load_day_entries(self, file_path: str) -> List[Dict[str, Any]]:
+        """加载某个短期记忆文件的条目（优先内存缓存，磁盘只读一次）"""
+        entries = memory_cache.get(file_path)
+        if entries is None:
+            if os.path.exists(file_path):
+                entries = _read_jsonl(file_path)
+                self._flushed_counts[file_path] = len(entries)
+            else:
+                # 兼容旧版整文件JSON格式：读入后随下次刷盘迁移为JSONL
+                legacy_path = file_path[:-len('.jsonl')] + '.json'
+                if os.path.exists(legacy_path):
+                    entries = _read_json(legacy_path)
+                    self._dirty_files.add(file_path)
+                else:
+                    entries = []
+                self._flushed_counts[file_path] = 0
+            memory_cache[file_path] = entries
+        return entries
+
+    def _schedule_flush(self, file_path: str):
+        """标记文件为脏并调度一次去抖的刷盘；无事件循环时立即写盘"""
+        self._dirty_files.add(file_path)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_dirty()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_after_delay())
+
+    async def _flush_after_delay(self):
+        """去抖窗口结束后在线程池中刷盘，磁盘写入不占用事件循环"""
+        await asyncio.sleep(_FLUSH_DELAY)
+        await asyncio.to_thread(self.flush_dirty)
+        # 刷盘期间新入队的条目不会触发调度（当时任务还未done），
+        # 结束后如仍有脏文件则立即再排一轮
+        if self._dirty_files:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_after_delay())
+
+    def flush_dirty(self):
+        """将尚未落盘的短期记忆条目追加写入磁盘"""
+        while self._dirty_files:
+            file_path = self._dirty_files.pop()
+            entries = memory_cache.get(file_path)
+            if entries is None:
+                continue
+            flushed = self._flushed_counts.get(file_path, 0)
+            pending = entries[flushed:]
+            if not pending:
+                continue
+            try:
+                _append_jsonl(file_path, pending)
+                # 只按实际写入的条数推进水位：刷盘在工作线程执行期间，
+                # 事件循环可能往entries追加新条目，用len(entries)会把
+                # 未写入的条目误记为已落盘
+                self._flushed_counts[file_path] = flushed + len(pending)
+            except Exception as e:
+                logger.error(f"刷盘短期记忆时出错: {e}")
     
     def add_short_term_memory(self, user_id: str, message: str, response: str = None):
         """添加短期记忆"""
@@ -61,26 +200,17 @@ class MemoryManager:
         
         try:
             file_path = self._get_user_short_term_file(user_id)
-            
-            # 读取现有记忆
-            memory_data = []
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    memory_data = json.load(f)
-            
-            # 添加新记忆
+
+            # 添加新记忆（追加到内存缓存，去抖后批量落盘）
             timestamp = datetime.now().isoformat()
             memory_entry = {
                 "timestamp": timestamp,
                 "message": message,
                 "response": response
             }
-            memory_data.append(memory_entry)
-            
-            # 保存记忆
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(memory_data, f, ensure_ascii=False, indent=2)
-                
+            self._load_day_entries(file_path).append(memory_entry)
+            self._schedule_flush(file_path)
+
             logger.debug(f"为用户 {user_id} 添加短期记忆")
         except Exception as e:
             logger.error(f"添加短期记忆时出错: {e}")
@@ -91,26 +221,28 @@ class MemoryManager:
         
         try:
             file_path = self._get_user_short_term_file(user_id)
-            
-            if not os.path.exists(file_path):
+
+            # 从内存缓存读取，包含尚未落盘的新条目
+            memory_data = self._load_day_entries(file_path)
+            if not memory_data:
                 return []
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                memory_data = json.load(f)
-            
-            # 过滤时间范围内的记忆
-            cutoff_time = datetime.now() - timedelta(hours=hours)
+
+            # 过滤时间范围内的记忆：条目按追加顺序时间有序，
+            # 从尾部倒序扫描，遇到过早的条目即可停止。
+            # ISO-8601时间串按字典序即时间序，直接比较字符串可免去逐条fromisoformat解析
+            cutoff_iso = (datetime.now() - timedelta(hours=hours)).isoformat()
             filtered_memories = []
-            
-            for entry in memory_data:
-                try:
-                    entry_time = datetime.fromisoformat(entry["timestamp"])
-                    if entry_time >= cutoff_time:
-                        filtered_memories.append(entry)
-                except ValueError:
-                    # 时间格式错误，跳过该条目
+
+            for entry in reversed(memory_data):
+                entry_time = entry.get("timestamp")
+                if not isinstance(entry_time, str):
+                    # 时间字段缺失或格式错误，跳过该条目
                     continue
-            
+                if entry_time < cutoff_iso:
+                    break
+                filtered_memories.append(entry)
+
+            filtered_memories.reverse()
             return filtered_memories
         except Exception as e:
             logger.error(f"获取短期记忆时出错: {e}")
@@ -133,13 +265,14 @@ class MemoryManager:
             
             # 这里应该调用AI进行总结，暂时存储原始内容
             long_term_file = self._get_long_term_file(user_id)
-            
-            # 读取现有长期记忆
-            long_term_data = {"memories": []}
-            if os.path.exists(long_term_file):
-                with open(long_term_file, 'r', encoding='utf-8') as f:
-                    long_term_data = json.load(f)
-            
+
+            # 读取现有长期记忆（优先内存缓存）
+            long_term_data = _long_term_cache.get(user_id)
+            if long_term_data is None:
+                long_term_data = {"memories": []}
+                if os.path.exists(long_term_file):
+                    long_term_data = _read_json(long_term_file)
+
             # 添加新的总结（此处简化处理，实际应由AI总结）
             summary_entry = {
                 "date": datetime.now().strftime("%Y-%m-%d"),
@@ -151,10 +284,10 @@ class MemoryManager:
             long_term_data["memories"].append(summary_entry)
             long_term_data["memories"] = long_term_data["memories"][-30:]
             
-            # 保存长期记忆
-            with open(long_term_file, 'w', encoding='utf-8') as f:
-                json.dump(long_term_data, f, ensure_ascii=False, indent=2)
-                
+            # 保存长期记忆并更新内存缓存
+            _write_json(long_term_file, long_term_data)
+            _long_term_cache[user_id] = long_term_data
+
             logger.info(f"为用户 {user_id} 保存长期记忆")
         except Exception as e:
             logger.error(f"保存长期记忆时出错: {e}")
@@ -162,14 +295,18 @@ class MemoryManager:
     def get_long_term_memory(self, user_id: str, days: int = 7) -> List[Dict[str, str]]:
         """获取用户的长期记忆"""
         try:
-            long_term_file = self._get_long_term_file(user_id)
-            
-            if not os.path.exists(long_term_file):
-                return []
-            
-            with open(long_term_file, 'r', encoding='utf-8') as f:
-                long_term_data = json.load(f)
-            
+            # 优先内存缓存，磁盘每用户最多读一次
+            long_term_data = _long_term_cache.get(user_id)
+            if long_term_data is None:
+                long_term_file = self._get_long_term_file(user_id)
+
+                if not os.path.exists(long_term_file):
+                    _long_term_cache[user_id] = {"memories": []}
+                    return []
+
+                long_term_data = _read_json(long_term_file)
+                _long_term_cache[user_id] = long_term_data
+
             # 返回最近几天的记忆
             memories = long_term_data.get("memories", [])
             if days < len(memories):
@@ -187,6 +324,8 @@ memory_manager = MemoryManager()
 
 def add_user_memory(user_id: str, message: str, response: str = None):
     """添加用户记忆"""
+    active_user_ids.add(user_id)
+    user_memory_version[user_id] = user_memory_version.get(user_id, 0) + 1
     memory_manager.add_short_term_memory(user_id, message, response)
 
 
@@ -201,29 +340,45 @@ def get_user_memories(user_id: str) -> Dict[str, List[Dict[str, str]]]:
     }
 
 
-def format_memories_for_ai(user_id: str) -> str:
-    """格式化记忆供AI使用"""
-    memories = get_user_memories(user_id)
-    
-    memory_context = []
-    
-    # 添加短期记忆上下文
+def _memory_lines(memories: Dict[str, List[Dict[str, str]]]):
+    """逐行生成记忆上下文文本，供join一次性拼接"""
+    # 短期记忆上下文
     if memories["short_term"]:
-        memory_context.append("以下是今天与用户的对话历史:")
+        yield "以下是今天与用户的对话历史:"
         for memory in memories["short_term"]:
-            memory_context.append(f"用户: {memory['message']}")
+            yield f"用户: {memory['message']}"
             if memory.get('response'):
-                memory_context.append(f"AI: {memory['response']}")
-    
-    # 添加长期记忆上下文
+                yield f"AI: {memory['response']}"
+
+    # 长期记忆上下文
     if memories["long_term"]:
-        memory_context.append("\n以下是最近几天的对话总结:")
+        yield "\n以下是最近几天的对话总结:"
         for memory in memories["long_term"]:
-            memory_context.append(f"{memory['date']}: {memory['summary']}")
-    
-    return "\n".join(memory_context) if memory_context else ""
+            yield f"{memory['date']}: {memory['summary']}"
+
+
+@lru_cache(maxsize=2048)
+def _format_memories_cached(user_id: str, version: int, day: str) -> str:
+    """按(用户, 记忆版本, 日期)缓存的记忆格式化实现"""
+    return "\n".join(_memory_lines(get_user_memories(user_id)))
+
+
+def format_memories_for_ai(user_id: str) -> str:
+    """格式化记忆供AI使用（记忆未变化时直接返回缓存结果）"""
+    # 日期参与缓存键：跨天后"今天的对话历史"换了短期记忆文件，
+    # 即使版本号未变也不能复用前一天的格式化结果
+    memory_manager._check_and_refresh_short_term_memory()
+    return _format_memories_cached(
+        user_id, user_memory_version.get(user_id, 0), memory_manager._today_str
+    )
+
+
+def flush_user_memories():
+    """将等待落盘的短期记忆立即写入磁盘（应用关闭时调用）"""
+    memory_manager.flush_dirty()
 
 
 def refresh_user_memory(user_id: str):
     """刷新用户记忆，将短期记忆总结为长期记忆"""
-    memory_manager.summarize_and_save_long_term_memory(user_id)
\ No newline at end of file
+    memory_manager.summarize_and_save_long_term_memory(user_id)
+    user_memory_version[user_id] = user_memory_version.get(user_id, 0) + 1
\ No newline at end of file
@@ -11,24 +11,12 @@ async def handle_message(data: Dict[str, Any]):
     Args:
         data: 接收到的消息数据
     """
-    # 检查消息类型
-    message_type = data.get("post_type", "")
-    
-    if message_type == "message":
-        # 处理消息事件
-        await handle_message_event(data)
-    elif message_type == "notice":
-        # 处理通知事件
-        await handle_notice_event(data)
-    elif message_type == "request":
-        # 处理请求事件
-        await handle_request_event(data)
-    elif message_type == "meta_event":
-        # 处理元事件
-        await handle_meta_event(data)
+    # 按post_type从分发表取处理函数（单次dict查找替代if/elif链）
+    handler = _DISPATCH.get(data.get("post_type", ""))
+    if handler is not None:
+        await handler(data)
     else:
-        # 处理其他类型事件
-        logger.warning(f"收到未识别类型的消息: {data}")
+        await handle_unknown_event(data)
 
 
 async def handle_message_event(data: Dict[str, Any]):
@@ -99,8 +87,27 @@ async def handle_request_event(data: Dict[str, Any]):
 async def handle_meta_event(data: Dict[str, Any]):
     """
     处理元事件
-    
+
     Args:
         data: 元事件数据
     """
-    logger.info(f"处理元事件: {data.get('meta_event_type', 'unknown')}")
\ No newline at end of file
+    logger.info(f"处理元事件: {data.get('meta_event_type', 'unknown')}")
+
+
+async def handle_unknown_event(data: Dict[str, Any]):
+    """
+    处理未识别类型的事件
+
+    Args:
+        data: 事件数据
+    """
+    logger.warning("收到未识别类型的消息: %s", data)
+
+
+# 事件分发表：post_type -> 处理函数
+_DISPATCH = {
+    "message": handle_message_event,
+    "notice": handle_notice_event,
+    "request": handle_request_event,
+    "meta_event": handle_meta_event,
+}
\ No newline at end of file
@@ -1,60 +1,323 @@
 import asyncio
 import logging
+import os
 import re
-from datetime import datetime
+import time
 from typing import Dict
-from modules.persistent_events_storage import get_processed_events, add_processed_event, cleanup_expired_events
+from modules.persistent_events_storage import add_processed_event, cleanup_expired_events, flush_events, is_recent
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from watchfiles import awatch
+    WATCHFILES_AVAILABLE = True
+except ImportError:
+    WATCHFILES_AVAILABLE = False
+
+# 可选的RE2后端：DFA实现保证线性时间匹配，彻底规避回溯；
+# 未安装或模式不被支持时回退标准库re
+try:
+    import re2 as _re_impl
+except ImportError:
+    _re_impl = re
 
 logger = logging.getLogger(__name__)
 
 
+def _compile(pattern: str):
+    """用可选的re2后端编译正则，编译失败时回退标准库re"""
+    if _re_impl is not re:
+        try:
+            return _re_impl.compile(pattern)
+        except Exception as e:
+            logger.warning(f"re2编译失败，回退标准库re: {e}")
+    return re.compile(pattern)
+
+# 玩家事件统一匹配模式：一次扫描即可分类事件并提取玩家名。
+# 可选前缀部分贪婪吞掉"...]: "日志头，保证捕获组中只留下玩家名；
+# 各事件类别的多种日志格式变体由该前缀统一覆盖
+# join/leave短语一定位于行尾，加$锚定可让失配尽早退出、避免回溯；
+# login的地址段用[^\]]+排除嵌套回溯
+_EVENT_RE = _compile(
+    r'(?:.*\]:\s*)?'
+    r'(?:(?P<join>.+?) joined the game$'
+    r'|(?P<login>.+?)\[/[^\]]+\] logged in with entity id'
+    r'|(?P<leave>.+?) left the game$'
+    r'|(?P<disconnect>.+?) lost connection: Disconnected)'
+)
+
+# 事件类型到群通知文案的映射表：与_EVENT_RE的命名分组一一对应，
+# 新增事件只需在正则和此表各加一项
+# 服务器启动完成标记（备用格式），模块加载时编译一次
+_DONE_RE = _compile(r'\[Server thread/INFO\].*Done .* Took .*,* seconds')
+
+_EVENT_MESSAGES = {
+    "join": "欢迎 {name} 加入游戏！",
+    "login": "玩家 {name} 正在登录游戏...",
+    "leave": "{name} 离开了游戏，再见！",
+    "disconnect": "{name} 断开了连接，再见！",
+}
+
+
+# 固定行尾短语的事件可以完全绕过正则：(事件类型, 短语)
+_SUFFIX_EVENTS = (
+    ("join", " joined the game"),
+    ("leave", " left the game"),
+)
+
+
+def _extract_suffix_event(line: str):
+    """
+    join/leave事件的纯字符串快速路径
+
+    这两类事件的短语固定出现在行尾，endswith + rfind的C级扫描
+    即可提取玩家名，语义与_EVENT_RE的锚定分支一致。
+
+    Args:
+        line: 日志行
+
+    Returns:
+        (事件类型, 玩家名)，不匹配时为None
+    """
+    for event_type, phrase in _SUFFIX_EVENTS:
+        if line.endswith(phrase):
+            head = line[:-len(phrase)]
+            idx = head.rfind(']: ')
+            player_name = (head[idx + 3:] if idx != -1 else head).strip()
+            if player_name:
+                return event_type, player_name
+            return None
+    return None
+
+
+def _iter_lines(text: str):
+    """
+    用find游标逐行产出文本，避免一次性物化整份行列表
+
+    Args:
+        text: 待切分的文本
+
+    Yields:
+        去除行尾\\r的单行内容
+    """
+    start = 0
+    n = len(text)
+    while start < n:
+        nl = text.find("\n", start)
+        if nl == -1:
+            line = text[start:]
+            start = n
+        else:
+            line = text[start:nl]
+            start = nl + 1
+        if line.endswith("\r"):
+            line = line[:-1]
+        yield line
+
+
+def _detect_server_startup(text: str) -> bool:
+    """
+    在日志内容中检测服务器启动完成标记
+
+    Args:
+        text: 日志内容
+
+    Returns:
+        是否检测到启动完成标记
+    """
+    for line in _iter_lines(text):
+        # 绝大多数行不含启动标记，先用C级子串扫描排除，避免进入正则引擎
+        if 'Done' not in line:
+            continue
+        # 支持多种日志格式的启动标记
+        if 'Done (' in line and ('For help, type "help"' in line or "For help, type 'help'" in line):
+            return True
+        if _DONE_RE.search(line):
+            return True
+    return False
+
+
+async def _process_batch(complete_text: str, config: Dict, send_message, server_started: bool) -> bool:
+    """
+    处理一批完整的日志行：启动标记检测、事件解析与批量发送
+
+    Args:
+        complete_text: 本批完整的日志文本（不含结尾的半行）
+        config: 配置信息
+        send_message: 发送消息的协程函数
+        server_started: 当前是否已检测到服务器启动完成
+
+    Returns:
+        更新后的server_started状态
+    """
+    if not server_started:
+        if _detect_server_startup(complete_text):
+            logger.info("检测到服务器启动完成")
+            server_started = True
+        else:
+            logger.debug("服务器尚未启动完成，等待中...")
+
+    # 解析为同步热循环，待发送消息收集后一次gather批量发出，
+    # 免去每行一次的协程帧分配与调度切换
+    new_lines_count = 0
+    pending_messages = []
+    # 整批共用同一时间戳，免去每行的clock_gettime调用
+    now = time.time()
+    for line in _iter_lines(complete_text):
+        if line and not line.isspace():  # 只处理非空行（不分配strip副本）
+            message_data = parse_log_line(line, config, now)
+            if message_data is not None:
+                pending_messages.append(message_data)
+            new_lines_count += 1
+    logger.debug("日志处理完成，新增 %s 行日志", new_lines_count)
+
+    if pending_messages:
+        results = await asyncio.gather(
+            *(send_message(m) for m in pending_messages),
+            return_exceptions=True
+        )
+        for message_data, send_result in zip(pending_messages, results):
+            if isinstance(send_result, Exception):
+                logger.error("发送消息到群聊时出错: %s", send_result)
+            else:
+                params = message_data["params"]
+                logger.info("已发送事件消息到群聊 %s: %s",
+                            params["group_id"], params["message"])
+    return server_started
+
+
+async def _watch_local_log(log_path: str, config: Dict):
+    """
+    通过文件系统通知增量读取本地日志（与面板同机部署时替代HTTP轮询）
+
+    Args:
+        log_path: latest.log的本地路径
+        config: 配置信息
+    """
+    from modules.websocket_manager import send_message
+
+    logger.info(f"使用本地文件监听模式读取日志: {log_path}")
+
+    last_offset = 0
+    partial = ""
+
+    def _read_new() -> str:
+        """读取上次偏移之后的新增字节（轮转/截断时从头开始）"""
+        nonlocal last_offset
+        try:
+            with open(log_path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size < last_offset:
+                    logger.info("检测到日志截断或轮转，重置读取位置")
+                    last_offset = 0
+                f.seek(last_offset)
+                data = f.read()
+                last_offset = f.tell()
+            return data.decode('utf-8', errors='replace')
+        except OSError as e:
+            logger.error(f"读取本地日志失败: {e}")
+            return ""
+
+    # 等待日志文件出现
+    while not os.path.exists(log_path):
+        logger.debug("本地日志文件尚不存在，等待中: %s", log_path)
+        await asyncio.sleep(10)
+
+    # 启动时跳过已有内容，只在其中检测启动标记
+    existing = await asyncio.to_thread(_read_new)
+    server_started = _detect_server_startup(existing)
+    if server_started:
+        logger.info("检测到服务器启动完成")
+    last_cleanup = time.monotonic()
+
+    async for _changes in awatch(log_path):
+        try:
+            new_text = await asyncio.to_thread(_read_new)
+            if new_text:
+                combined = partial + new_text
+                newline_idx = combined.rfind("\n")
+                if newline_idx == -1:
+                    partial = combined
+                else:
+                    complete_text = combined[:newline_idx]
+                    partial = combined[newline_idx + 1:]
+                    server_started = await _process_batch(
+                        complete_text, config, send_message, server_started
+                    )
+
+            # 周期性清理过期事件记录并批量落盘
+            if time.monotonic() - last_cleanup >= 60:
+                cleanup_expired_events()
+                await asyncio.to_thread(flush_events)
+                last_cleanup = time.monotonic()
+        except Exception as e:
+            logger.error(f"处理本地日志变更时出错: {e}", exc_info=True)
+
+
 async def parse_minecraft_logs(config: Dict):
     """
     定时解析Minecraft日志文件，检测玩家加入和离开事件
-    
+
     Args:
         config: 配置信息
     """
     # 延迟导入以避免循环导入
     from modules.file_api_handler import get_http_client, FILE_DEFAULT_DAEMON_ID, FILE_DEFAULT_UUID
     from modules.websocket_manager import send_message
+
+    # 与服务器同机部署时可配置本地监听模式：事件延迟降到秒级以内，
+    # 并省去每10秒一次的HTTP轮询；不可用时回退HTTP
+    log_source_config = config.get('minecraft_log', {})
+    if log_source_config.get('source') == 'local':
+        local_path = log_source_config.get('local_path', '')
+        if local_path and WATCHFILES_AVAILABLE:
+            await _watch_local_log(local_path, config)
+            return
+        logger.warning("本地日志监听模式不可用（缺少watchfiles或未配置local_path），回退HTTP轮询")
     
-    # 获取已处理的事件列表
-    global processed_events
-    processed_events = get_processed_events()
-    
+
     http_client = await get_http_client()
     FILE_API_BASE_URL = config.get('file_api', {}).get('base_url', '')
     FILE_API_KEY = config.get('file_api', {}).get('api_key', '')
     
     # 等待应用启动完成
     await asyncio.sleep(5)
-    
-    last_position = -1
+
+    # 请求参数在整个轮询期间不变，循环外构建一次即可
+    params = {
+        "apikey": FILE_API_KEY,
+        "daemonId": FILE_DEFAULT_DAEMON_ID,
+        "uuid": FILE_DEFAULT_UUID
+    }
+    body = {
+        "target": "/logs/latest.log"
+    }
+
+    # 已处理内容的末尾偏移（字符数），-1表示尚未初始化
+    last_offset = -1
     server_started = False
+    # 过期事件清理按分钟级周期执行，不在每个事件上触发
+    last_cleanup = time.monotonic()
     
     while True:
         try:
-            # 更新已处理事件列表
-            processed_events = get_processed_events()
-            
-            logger.info("开始获取Minecraft日志文件...")
+            logger.debug("开始获取Minecraft日志文件...")
             # 调用API获取日志内容
-            params = {
-                "apikey": FILE_API_KEY,
-                "daemonId": FILE_DEFAULT_DAEMON_ID,
-                "uuid": FILE_DEFAULT_UUID
-            }
-            body = {
-                "target": "/logs/latest.log"
-            }
-            logger.info(f"请求参数: URL={FILE_API_BASE_URL}, params={params}, body={body}")
+            logger.debug("请求参数: URL=%s, params=%s, body=%s", FILE_API_BASE_URL, params, body)
+            # 注意：面板把日志整体包在JSON envelope的data字段里返回，
+            # 无法按行流式消费（行边界要等整个JSON解析完才存在），
+            # 因此这里整体下载后按字符偏移做增量处理
             response = await http_client.put(FILE_API_BASE_URL, params=params, json=body)
-            logger.info(f"日志API响应状态码: {response.status_code}")
+            logger.debug("日志API响应状态码: %s", response.status_code)
             
             if response.status_code == 200:
-                result = response.json()
-                logger.info("日志API请求成功")
+                # orjson直接解析原始字节，对大日志负载明显快于stdlib json
+                result = orjson.loads(response.content) if orjson is not None else response.json()
+                logger.debug("日志API请求成功")
                 # 检查响应格式并提取日志内容
                 if isinstance(result, dict):
                     if result.get("status") == "success":
@@ -73,64 +336,48 @@ async def parse_minecraft_logs(config: Dict):
                     log_content = ""
                 
                 if log_content:
-                    # 解析日志内容
-                    lines = log_content.split("\n")
-                    logger.info(f"成功获取日志内容，共 {len(lines)} 行")
-                    
-                    if last_position == -1:
-                        last_position = len(lines)
-                        logger.info(f"初始化日志位置: {last_position}，将只处理之后的日志")
+                    total_len = len(log_content)
+                    logger.debug("成功获取日志内容，共 %s 个字符", total_len)
+
+                    if last_offset == -1:
+                        # 首次获取：在现有内容中检测启动标记，之后只处理新增部分
+                        last_offset = total_len
+                        logger.info(f"初始化日志位置: {last_offset}，将只处理之后的日志")
+                        if not server_started and _detect_server_startup(log_content):
+                            logger.info("检测到服务器启动完成")
+                            server_started = True
                         continue  # 跳过本次循环，下次再处理新日志
-                    
-                    # 检查服务器是否已启动完成
-                    if not server_started:
-                        logger.info("检查服务器是否已启动完成...")
-                        for line in lines:
-                            # 修复服务器启动检测逻辑，支持更多日志格式
-                            if 'Done (' in line and ('For help, type "help"' in line or "For help, type 'help'" in line):
-                                logger.info("检测到服务器启动完成")
-                                server_started = True
-                                # 记录当前日志位置，只处理之后的新事件
-                                last_position = len(lines)
-                                break
-                            # 添加额外的服务器启动检测方式
-                            if re.search(r'\[Server thread/INFO\].*Done .* Took .*,* seconds', line):
-                                logger.info("检测到服务器启动完成（备用方式）")
-                                server_started = True
-                                last_position = len(lines)
-                                break
-                    
-                    # 如果服务器已启动，则开始处理玩家事件
-                    if server_started:
-                        logger.info(f"服务器已启动，开始处理日志事件，当前位置: {last_position}")
-                        new_lines_count = 0
-                        # 处理新的日志行
-                        for i in range(last_position, len(lines)):
-                            line = lines[i]
-                            if line.strip():  # 只处理非空行
-                                await process_log_line(line, config)
-                                new_lines_count += 1
-                        
-                        # 更新位置
-                        last_position = len(lines)
-                        logger.info(f"日志处理完成，新增 {new_lines_count} 行日志")
+
+                    if last_offset > total_len:
+                        # 日志被截断或轮转（服务器重启），从头处理新文件
+                        logger.info("检测到日志截断或轮转，重置读取位置")
+                        last_offset = 0
+
+                    # 只解析新增的尾部内容，且只处理完整的行（不足一行的部分留到下次）
+                    new_text = log_content[last_offset:]
+                    newline_idx = new_text.rfind("\n")
+                    if newline_idx == -1:
+                        logger.debug("没有新增的完整日志行")
                     else:
-                        logger.info("服务器尚未启动完成，等待中...")
-                        new_lines_count = 0
-                        for i in range(last_position, len(lines)):
-                            line = lines[i]
-                            if line.strip():  # 只处理非空行
-                                await process_log_line(line, config)
-                                new_lines_count += 1
-                        last_position = len(lines)
-                        logger.info(f"处理了 {new_lines_count} 行日志")
+                        complete_text = new_text[:newline_idx]
+                        last_offset += newline_idx + 1
+
+                        server_started = await _process_batch(
+                            complete_text, config, send_message, server_started
+                        )
                 else:
                     logger.warning("获取到的日志内容为空")
             else:
-                logger.error(f"获取日志HTTP错误: {response.status_code}")
-            
+                logger.error("获取日志HTTP错误: %s", response.status_code)
+
+            # 周期性清理过期事件记录（超过1小时的记录）并批量落盘
+            if time.monotonic() - last_cleanup >= 60:
+                cleanup_expired_events()
+                await asyncio.to_thread(flush_events)
+                last_cleanup = time.monotonic()
+
             # 等待10秒再检查
-            logger.info("等待10秒后再次检查日志...")
+            logger.debug("等待10秒后再次检查日志...")
             await asyncio.sleep(10)
             
         except Exception as e:
@@ -138,141 +385,76 @@ async def parse_minecraft_logs(config: Dict):
             await asyncio.sleep(10)
 
 
-async def process_log_line(line: str, config: Dict):
+def parse_log_line(line: str, config: Dict, now: float = None):
     """
-    处理单行日志，检测玩家加入或离开事件
-    
+    解析单行日志，检测玩家加入或离开事件
+
     Args:
         line: 日志行
         config: 配置信息
+        now: 当前时间（Unix秒），批量解析时由调用方传入以复用同一时间戳
+
+    Returns:
+        需要发送的群消息数据，无需通知时为None
     """
-    from .websocket_manager import send_message
-    
-    logger.debug(f"处理日志行: {line}")
-    current_time = datetime.now()
-    
-    # 检测玩家加入游戏
-    # 支持多种日志格式
-    join_patterns = [
-        r'\[Server thread/INFO\] \[net\.minecraft\.server\.MinecraftServer/\]: (.+) joined the game',
-        r'\[Server thread/INFO\] \[minecraft/MinecraftServer\]: (.+) joined the game',
-        r'\[Server thread/INFO\]: (.+) joined the game',
-        r'(.+) joined the game'
-    ]
-    
+    # 关键词门卫：绝大多数日志行（聊天、tick、区块加载等）不含任何事件关键词，
+    # 先用C级子串扫描排除，避免进入正则引擎
+    if ('joined the game' not in line
+            and 'left the game' not in line
+            and 'lost connection: Disconnected' not in line
+            and 'logged in with entity id' not in line):
+        return None
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("处理日志行: %s", line)
+    current_time = now if now is not None else time.time()
+
+    # 先走行尾短语的纯字符串快速路径，login/disconnect再进正则
     player_name = None
     event_type = None
-    
-    for pattern in join_patterns:
-        join_match = re.search(pattern, line)
-        if join_match:
-            player_name = join_match.group(1).strip()  # 添加.strip()去除可能的空白字符
-            event_type = "join"
-            logger.info(f"检测到玩家加入游戏事件: {player_name} (使用模式: {pattern})")
-            break
-    
-    if not player_name:
-        # 检测玩家登录事件（在加入游戏之前）
-        login_patterns = [
-            r'\[Server thread/INFO\] \[minecraft/PlayerList\]: (.+)\[/.+\] logged in with entity id .+'
-        ]
-        
-        for pattern in login_patterns:
-            login_match = re.search(pattern, line)
-            if login_match:
-                player_name = login_match.group(1).strip()  # 添加.strip()去除可能的空白字符
-                event_type = "login"
-                logger.info(f"检测到玩家登录事件: {player_name} (使用模式: {pattern})")
-                break
-    
-    if not player_name:
-        # 检测玩家离开游戏
-        leave_patterns = [
-            r'\[Server thread/INFO\] \[net\.minecraft\.server\.MinecraftServer/\]: (.+) left the game',
-            r'\[Server thread/INFO\] \[minecraft/MinecraftServer\]: (.+) left the game',
-            r'\[Server thread/INFO\]: (.+) left the game',
-            r'(.+) left the game'
-        ]
-        
-        for pattern in leave_patterns:
-            leave_match = re.search(pattern, line)
-            if leave_match:
-                player_name = leave_match.group(1).strip()  # 添加.strip()去除可能的空白字符
-                event_type = "leave"
-                logger.info(f"检测到玩家离开游戏事件: {player_name} (使用模式: {pattern})")
-                break
-    
-    if not player_name:
-        # 检测玩家断开连接
-        disconnect_patterns = [
-            r'\[Server thread/INFO\] \[net\.minecraft\.server\.network\.ServerGamePacketListenerImpl/\]: (.+) lost connection: Disconnected',
-            r'\[Server thread/INFO\] \[minecraft\.server\.network\.ServerGamePacketListenerImpl/\]: (.+) lost connection: Disconnected',
-            r'\[Server thread/INFO\]: (.+) lost connection: Disconnected',
-            r'(.+) lost connection: Disconnected',
-            r'\[Server thread/INFO\] \[minecraft/ServerLoginPacketListenerImpl\]: com\.mojang\.authlib\.GameProfile@.+?\[id=.+?,name=(.+?),properties=.+?\] \(.+\) lost connection: Disconnected'
-        ]
-        
-        for pattern in disconnect_patterns:
-            disconnect_match = re.search(pattern, line)
-            if disconnect_match:
-                player_name = disconnect_match.group(1).strip()  # 添加.strip()去除可能的空白字符
-                event_type = "disconnect"
-                logger.info(f"检测到玩家断开连接事件: {player_name} (使用模式: {pattern})")
-                break
-    
+    suffix_event = _extract_suffix_event(line)
+    if suffix_event is not None:
+        event_type, player_name = suffix_event
+    else:
+        event_match = _EVENT_RE.search(line)
+        if event_match:
+            event_type = event_match.lastgroup
+            player_name = event_match.group(event_type).strip()  # 去除可能的空白字符
+    if event_type:
+        logger.info("检测到玩家%s事件: %s", event_type, player_name)
+
     # 如果检测到玩家事件
     if player_name and event_type:
         # 使用更精确的事件键，包含事件类型和日志行内容
         event_key = f"{event_type}:{player_name}"
         
         # 检查事件是否已处理且在短时间内（避免重复通知）
-        should_process = True
-        global processed_events
-        if event_key in processed_events:
-            last_processed_time = processed_events[event_key]
-            # 如果在5分钟内已经处理过相同事件，则跳过
-            if (current_time - last_processed_time).total_seconds() < 300:
-                should_process = False
-                logger.info(f"事件 {event_key} 在5分钟内已处理过，跳过通知")
-        
+        # 直接查询存储模块的缓存，不再每轮复制整份事件字典
+        should_process = not is_recent(event_key, current_time)
+        if not should_process:
+            logger.debug("事件 %s 在5分钟内已处理过，跳过通知", event_key)
+
         if should_process:
-            # 添加事件到持久化存储
+            # 添加事件到持久化存储（同批次的重复事件由上面的查询兜住）
             add_processed_event(event_key, current_time)
-            # 重新获取处理过的事件列表（可能已更新）
-            processed_events = get_processed_events()
-            
-            # 清理过期的事件记录（超过1小时的记录）
-            cleanup_expired_events()
-            
-            # 发送消息到群聊（需要在配置中指定群号）
+
+            # 构造群聊通知，由调用方统一批量发送（需要在配置中指定群号）
             group_id = config.get("server_group_id", "")  # 需要在配置中添加
             if group_id:
-                message = ""
-                if event_type == "join":
-                    message = f"欢迎 {player_name} 加入游戏！"
-                elif event_type == "login":
-                    message = f"玩家 {player_name} 正在登录游戏..."
-                elif event_type == "leave":
-                    message = f"{player_name} 离开了游戏，再见！"
-                elif event_type == "disconnect":
-                    message = f"{player_name} 断开了连接，再见！"
-                
+                message = _EVENT_MESSAGES.get(event_type, "").format(name=player_name)
+
                 if message:
-                    try:
-                        message_data = {
-                            "action": "send_group_msg",
-                            "params": {
-                                "group_id": group_id,
-                                "message": message
-                            }
+                    return {
+                        "action": "send_group_msg",
+                        "params": {
+                            "group_id": group_id,
+                            "message": message
                         }
-                        await send_message(message_data)
-                        logger.info(f"已发送{event_type}消息到群聊 {group_id}: {message}")
-                    except Exception as e:
-                        logger.error(f"发送消息到群聊时出错: {e}", exc_info=True)
+                    }
             else:
                 logger.warning(f"检测到玩家{event_type}事件但未配置server_group_id，无法发送通知")
         else:
-            logger.info(f"跳过处理事件: {event_type}:{player_name}")
+            logger.debug("跳过处理事件: %s:%s", event_type, player_name)
     else:
-        logger.debug(f"未匹配到任何玩家事件: {line}")
\ No newline at end of file
+        logger.debug("未匹配到任何玩家事件: %s", line)
+    return None
\ No newline at end of file
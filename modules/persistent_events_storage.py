@@ -1,21 +1,40 @@
 import os
 import json
 import logging
-from datetime import datetime, timedelta
+import time
+from collections import OrderedDict
+from datetime import datetime
 from typing import Dict
 from threading import Lock
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 # 事件存储文件路径
 EVENTS_STORAGE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "events_storage.json")
 
-# 内存中的事件缓存
-processed_events: Dict[str, datetime] = {}
+# 内存中的事件缓存：按时间顺序插入的OrderedDict，
+# 最旧的事件始终位于头部，过期清理只需从头部弹出。
+# 在模块加载时一次性从文件初始化（见文件末尾），
+# 访问函数不再做惰性加载检查
 
 # 添加线程锁确保线程安全
 _lock = Lock()
 
+# 有未落盘修改时置位，由flush_events批量写入，
+# 避免每个事件都整文件重写
+_dirty = False
+
+# 固定槽位的去重快速缓存：slot -> (key哈希, 时间戳)。
+# 命中即短路，避免进入权威OrderedDict；写入时同步更新。
+# 依赖64位字符串哈希相等，不同键碰撞概率可忽略
+_FAST_MASK = 1023
+_fast_cache = [(0, 0.0)] * (_FAST_MASK + 1)
+
 # 初始化时确保文件存在
 try:
     if not os.path.exists(EVENTS_STORAGE_FILE):
@@ -26,127 +45,167 @@ except Exception as e:
     logger.error(f"创建事件存储文件时出错: {e}")
 
 
-def _load_events_from_file() -> Dict[str, datetime]:
+def _load_events_from_file() -> Dict[str, float]:
     """
     从文件加载已处理的事件
     
     Returns:
-        包含事件标识符和时间戳的字典
+        包含事件标识符和时间戳（Unix秒）的字典
     """
     try:
         if os.path.exists(EVENTS_STORAGE_FILE):
-            with open(EVENTS_STORAGE_FILE, 'r', encoding='utf-8') as f:
-                events_data = json.load(f)
-            
-            # 将字符串时间转换为datetime对象
+            # orjson直接解析原始字节，比stdlib json快数倍
+            if orjson is not None:
+                with open(EVENTS_STORAGE_FILE, 'rb') as f:
+                    events_data = orjson.loads(f.read())
+            else:
+                with open(EVENTS_STORAGE_FILE, 'r', encoding='utf-8') as f:
+                    events_data = json.load(f)
+
+            # 时间戳以Unix秒存储；兼容旧文件中的ISO字符串格式
             events = {}
-            for event_key, timestamp_str in events_data.items():
+            for event_key, raw in events_data.items():
+                if isinstance(raw, (int, float)):
+                    events[event_key] = float(raw)
+                    continue
                 try:
-                    events[event_key] = datetime.fromisoformat(timestamp_str)
-                except ValueError:
-                    logger.warning(f"无法解析事件时间戳: {timestamp_str}")
-            
+                    events[event_key] = datetime.fromisoformat(raw).timestamp()
+                except (TypeError, ValueError):
+                    logger.warning(f"无法解析事件时间戳: {raw}")
+
             logger.info(f"从文件加载了 {len(events)} 个已处理事件")
-            return events
+            # 按时间排序后重建，保证头部永远是最旧事件
+            return OrderedDict(sorted(events.items(), key=lambda kv: kv[1]))
         else:
             logger.info("事件存储文件不存在，将创建新文件")
-            return {}
+            return OrderedDict()
     except Exception as e:
         logger.error(f"加载事件存储文件时出错: {e}")
-        return {}
+        return OrderedDict()
 
 
-def _save_events_to_file(events: Dict[str, datetime]):
+def _save_events_to_file(events: Dict[str, float]):
     """
     将事件保存到文件
     
     Args:
-        events: 包含事件标识符和时间戳的字典
+        events: 包含事件标识符和时间戳（Unix秒）的字典
     """
     try:
-        # 将datetime对象转换为字符串
-        events_data = {}
-        for event_key, timestamp in events.items():
-            events_data[event_key] = timestamp.isoformat()
-        
-        with open(EVENTS_STORAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(events_data, f, ensure_ascii=False, indent=2)
-        
+        # 时间戳本就是数值，事件字典可以原样序列化，无需构建临时副本
+        # 先写临时文件再原子替换，进程中途退出也不会留下残缺文件
+        tmp_path = EVENTS_STORAGE_FILE + '.tmp'
+        if orjson is not None:
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(events, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(events, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, EVENTS_STORAGE_FILE)
+
         logger.debug(f"保存了 {len(events)} 个事件到存储文件")
     except Exception as e:
         logger.error(f"保存事件存储文件时出错: {e}")
 
 
-def get_processed_events() -> Dict[str, datetime]:
+def get_processed_events() -> Dict[str, float]:
     """
-    获取已处理事件的全局缓存，如果缓存为空则从文件加载
-    
+    获取已处理事件的全局缓存
+
     Returns:
-        包含事件标识符和时间戳的字典
+        包含事件标识符和时间戳的字典（调用方只读，不要直接修改）
     """
-    global processed_events
-    
-    with _lock:
-        if not processed_events:
-            processed_events = _load_events_from_file()
-        return processed_events.copy()
+    return processed_events
+
+
+def is_recent(event_key: str, now: float = None, window_seconds: float = 300) -> bool:
+    """
+    判断事件是否在时间窗口内已处理过
 
+    Args:
+        event_key: 事件标识符（格式：事件类型:玩家名）
+        now: 当前时间（Unix秒），不传则取time.time()
+        window_seconds: 去重时间窗口（秒）
 
-def add_processed_event(event_key: str, timestamp: datetime):
+    Returns:
+        窗口内已处理过返回True
+    """
+    if now is None:
+        now = time.time()
+
+    # 快速路径：固定槽位缓存命中直接判定
+    key_hash = hash(event_key)
+    cached_hash, cached_ts = _fast_cache[key_hash & _FAST_MASK]
+    if cached_hash == key_hash and now - cached_ts < window_seconds:
+        return True
+
+    # 权威存储兜底（槽位被其他键覆盖或窗口已过）
+    timestamp = processed_events.get(event_key)
+    if timestamp is None:
+        return False
+    return now - timestamp < window_seconds
+
+
+def add_processed_event(event_key: str, timestamp: float):
     """
     添加已处理事件到缓存和文件
     
     Args:
         event_key: 事件标识符（格式：事件类型:玩家名）
-        timestamp: 事件处理时间戳
+        timestamp: 事件处理时间戳（Unix秒）
     """
-    global processed_events
-    
+    global _dirty
+
     with _lock:
-        # 如果缓存为空，先加载现有数据
-        if not processed_events:
-            processed_events = _load_events_from_file()
-        
-        # 添加新事件
+        # 添加新事件并移到尾部，维持时间有序
+        # （过期清理由定时任务统一处理，不在每次插入时全量扫描）
+        processed_events.pop(event_key, None)
         processed_events[event_key] = timestamp
-        
-        # 清理过期事件（超过1小时的事件）
-        current_time = datetime.now()
-        expired_keys = [
-            key for key, event_time in processed_events.items()
-            if (current_time - event_time).total_seconds() > 3600
-        ]
-        
-        for key in expired_keys:
-            del processed_events[key]
-        
-        # 保存到文件
-        _save_events_to_file(processed_events)
+
+        # 同步更新快速缓存槽位
+        key_hash = hash(event_key)
+        _fast_cache[key_hash & _FAST_MASK] = (key_hash, timestamp)
+
+        # 标记待落盘，由flush_events批量写入
+        _dirty = True
 
 
 def cleanup_expired_events():
     """
     清理过期事件并保存到文件
     """
-    global processed_events
-    
+    global _dirty
+
     with _lock:
-        # 如果缓存为空，先加载现有数据
-        if not processed_events:
-            processed_events = _load_events_from_file()
-        
-        # 清理过期事件（超过1小时的事件）
-        current_time = datetime.now()
-        expired_keys = [
-            key for key, event_time in processed_events.items()
-            if (current_time - event_time).total_seconds() > 3600
-        ]
-        
-        for key in expired_keys:
-            del processed_events[key]
-        
-        if expired_keys:
-            logger.info(f"清理了 {len(expired_keys)} 个过期事件")
-        
-        # 保存到文件
-        _save_events_to_file(processed_events)
\ No newline at end of file
+        # 清理过期事件（超过1小时的事件）：
+        # 事件按时间有序，只需从头部弹出到首个未过期项为止
+        current_time = time.time()
+        expired_count = 0
+        while processed_events:
+            event_time = next(iter(processed_events.values()))
+            if current_time - event_time > 3600:
+                processed_events.popitem(last=False)
+                expired_count += 1
+            else:
+                break
+
+        if expired_count:
+            logger.info(f"清理了 {expired_count} 个过期事件")
+            _dirty = True
+
+
+def flush_events():
+    """
+    将未落盘的事件修改写入文件（由定时任务和应用关闭时调用）
+    """
+    global _dirty
+
+    with _lock:
+        if not _dirty:
+            return
+        _save_events_to_file(processed_events)
+        _dirty = False
+
+
+# 模块加载时一次性初始化缓存，去掉各访问函数里每次都要走的惰性加载分支
+processed_events = _load_events_from_file()
\ No newline at end of file
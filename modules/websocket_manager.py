@@ -4,10 +4,91 @@ import logging
 import websockets
 from typing import Dict, Any
 
+try:
+    from websockets.protocol import State
+except ImportError:
+    State = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logging.warning("orjson库未安装，将使用标准库json进行消息序列化")
+
 logger = logging.getLogger(__name__)
 
-# 存储WebSocket连接
-websocket_connections: Dict[str, Any] = {}
+# 消息序列化/反序列化函数，优先使用orjson（解析快3-10倍，序列化直接产生bytes）
+if orjson is not None:
+    _loads = orjson.loads
+
+    def _dumps(message: Dict[str, Any]) -> bytes:
+        return orjson.dumps(message)
+else:
+    _loads = json.loads
+
+    def _dumps(message: Dict[str, Any]) -> bytes:
+        return json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+# 当前OneBot WebSocket连接（单连接设计，模块属性读取比dict查找更直接）
+current_ws = None
+
+# 出站消息队列，由后台写入任务统一发送
+outbound_queue: "asyncio.Queue[Any]" = asyncio.Queue()
+
+# 出站写缓冲高水位线（字节），超过则丢弃消息，避免慢连接拖垮内存
+_WRITE_BUFFER_HIGH_WATER = 1_000_000
+
+
+def is_connection_open(connection) -> bool:
+    """
+    判断WebSocket连接是否处于OPEN状态
+
+    新版websockets（v11+）通过connection.state暴露状态，
+    旧版的.open属性已废弃；两者都不可用时保守视为未打开。
+
+    Args:
+        connection: WebSocket连接对象（可为None）
+
+    Returns:
+        连接已打开返回True
+    """
+    if connection is None:
+        return False
+    state = getattr(connection, 'state', None)
+    if State is not None and state is not None:
+        return state is State.OPEN
+    return bool(getattr(connection, 'open', False))
+
+
+async def _writer(websocket, queue: "asyncio.Queue[Any]"):
+    """
+    后台写入协程：从队列中取出消息并批量连续发送
+
+    Args:
+        websocket: WebSocket连接对象
+        queue: 出站消息队列
+    """
+    while True:
+        # 等待第一条消息，然后一次性取出队列中已就绪的所有消息
+        batch = [await queue.get()]
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+
+        for item in batch:
+            try:
+                # 背压保护：写缓冲积压过多时丢弃消息
+                transport = getattr(websocket, 'transport', None)
+                if transport is not None and transport.get_write_buffer_size() > _WRITE_BUFFER_HIGH_WATER:
+                    logger.warning("WebSocket写缓冲超过高水位线，丢弃消息")
+                    continue
+
+                await websocket.send(item if isinstance(item, (bytes, str)) else _dumps(item))
+                logger.debug("发送消息: %s", item)
+            except websockets.exceptions.ConnectionClosed:
+                logger.warning("WebSocket连接已关闭，停止发送消息")
+                return
+            except Exception as e:
+                logger.error(f"发送消息时发生错误: {e}")
 
 
 async def connect_to_onebot(ws_url: str, token: str):
@@ -18,6 +99,8 @@ async def connect_to_onebot(ws_url: str, token: str):
         ws_url: WebSocket服务器地址
         token: 认证令牌
     """
+    global current_ws
+
     headers = {
         "Authorization": f"Bearer {token}"
     }
@@ -25,16 +108,26 @@ async def connect_to_onebot(ws_url: str, token: str):
     while True:
         try:
             logger.info(f"正在连接到OneBot WebSocket服务器: {ws_url}")
+            # 本地链路上permessage-deflate的CPU/内存开销大于带宽收益，关闭压缩
             websocket = await websockets.connect(
                 ws_url,
-                additional_headers=headers
+                additional_headers=headers,
+                compression=None
             )
-            websocket_connections["onebot"] = websocket
+            current_ws = websocket
             logger.info("成功连接到OneBot WebSocket服务器")
-            
-            # 开始接收消息
-            await receive_messages(websocket)
-            
+
+            # 启动后台写入任务并开始接收消息
+            writer_task = asyncio.create_task(_writer(websocket, outbound_queue))
+            try:
+                await receive_messages(websocket)
+            finally:
+                writer_task.cancel()
+                try:
+                    await writer_task
+                except asyncio.CancelledError:
+                    pass
+
         except websockets.exceptions.ConnectionClosed:
             logger.warning("与OneBot WebSocket服务器的连接已关闭，将在5秒后尝试重新连接...")
             await asyncio.sleep(5)
@@ -44,21 +137,54 @@ async def connect_to_onebot(ws_url: str, token: str):
             await asyncio.sleep(5)
 
 
+def _is_heartbeat(frame) -> bool:
+    """
+    判断帧是否为OneBot心跳元事件（在JSON解析前做原始子串探测）
+
+    心跳每隔几秒发送一次且只会被日志记录，无需解析JSON。
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        return (b'"post_type":"meta_event"' in frame
+                and b'"meta_event_type":"heartbeat"' in frame)
+    return ('"post_type":"meta_event"' in frame
+            and '"meta_event_type":"heartbeat"' in frame)
+
+
+def _is_group_message_without_at(frame) -> bool:
+    """
+    判断帧是否为未@任何人的群聊消息（在JSON解析前做原始子串探测）
+
+    仅在紧凑JSON格式下命中；格式不匹配时返回False，走正常解析路径。
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        return (b'"post_type":"message"' in frame
+                and b'"message_type":"group"' in frame
+                and b'[CQ:at,qq=' not in frame)
+    return ('"post_type":"message"' in frame
+            and '"message_type":"group"' in frame
+            and '[CQ:at,qq=' not in frame)
+
+
 async def receive_messages(websocket):
     """
     接收来自OneBot WebSocket服务器的消息
-    
+
     Args:
         websocket: WebSocket连接对象
     """
     # 延迟导入以避免循环导入
     from modules.message_handler import handle_message
-    
+
     async for message in websocket:
         try:
-            # 解析接收到的消息
-            data = json.loads(message)
-            logger.info(f"收到消息: {data}")
+            # 快速路径：心跳元事件与群聊中未@任何人的消息不会触发任何处理，跳过JSON解析
+            if _is_heartbeat(message) or _is_group_message_without_at(message):
+                continue
+
+            # 解析接收到的消息（orjson同时接受str和bytes，无需额外解码）
+            data = _loads(message)
+            # 懒格式化并降级到DEBUG，避免每帧都对完整消息做repr
+            logger.debug("收到消息: %s", data)
             
             # 处理不同类型的消息
             await handle_message(data)
@@ -76,26 +202,20 @@ async def send_message(message: Dict[str, Any]):
     Args:
         message: 要发送的消息数据
     """
-    connection = websocket_connections.get("onebot")
-    if connection:
-        try:
-            # 检查连接是否打开
-            if hasattr(connection, 'open'):
-                if not connection.open:
-                    logger.warning("WebSocket连接已关闭，无法发送消息")
-                    return
-            # 如果没有open属性，则直接尝试发送并在异常中处理
-            
-            await connection.send(json.dumps(message, ensure_ascii=False))
-            logger.info(f"发送消息: {message}")
-        except Exception as e:
-            logger.error(f"发送消息时发生错误: {e}")
-    else:
+    connection = current_ws
+    if connection is None:
         logger.warning("WebSocket连接不可用，无法发送消息")
+        return
+    # 检查连接是否打开，死连接在入队和序列化前就短路
+    if not is_connection_open(connection):
+        logger.warning("WebSocket连接已关闭，无法发送消息")
+        return
+    # 将消息放入出站队列，由后台写入任务批量发送
+    outbound_queue.put_nowait(message)
 
 
-def get_websocket_connections():
+def get_current_connection():
     """
-    获取WebSocket连接字典
+    获取当前OneBot WebSocket连接（未连接时为None）
     """
-    return websocket_connections
\ No newline at end of file
+    return current_ws
\ No newline at end of file